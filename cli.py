@@ -0,0 +1,31 @@
+import os
+import sys
+import orjson
+from engine import ChessDoctor, analyze_games_parallel, split_pgn_games
+
+def run_cli(pgn_file_path, engine_path=None):
+    """Analyze the game(s) in a PGN file and print the analysis as JSON"""
+    # A file with several games gets a list of analyses, worked out in parallel
+    pgn_games = []
+    if os.path.isfile(pgn_file_path):
+        with open(pgn_file_path) as pgn_file:
+            pgn_games = split_pgn_games(pgn_file.read())
+    
+    try:
+        if len(pgn_games) > 1:
+            analysis_data = analyze_games_parallel(pgn_games, engine_path)
+        else:
+            # The only engine running, so it may search on all but one CPU
+            with ChessDoctor(engine_path, threads=max(1, (os.cpu_count() or 1) - 1)) as chess_doctor:
+                analysis_data = chess_doctor.analyze_game(pgn_file_path)
+        print(orjson.dumps(analysis_data, option=orjson.OPT_INDENT_2).decode())
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        print("\nStockfish could not be found automatically. Please make sure Stockfish is installed and either:")
+        print("1. Add it to your system PATH")
+        print("2. Provide the path using --engine option")
+        print("\nInstallation instructions:")
+        print("- Linux: sudo apt-get install stockfish (Debian/Ubuntu)")
+        print("- macOS: brew install stockfish (using Homebrew)")
+        print("- Windows: Download from https://stockfishchess.org/download/ and install")
+        sys.exit(1)
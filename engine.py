@@ -1,12 +1,64 @@
+import atexit
+import bisect
 import chess
 import chess.pgn
 import chess.engine
+import chess.polyglot
+import concurrent.futures
+import functools
+import io
+import itertools
+import multiprocessing
 import os
+import queue
+import shutil
 import sys
+import threading
+
+# Square groups used by the positional heuristics
+CENTER_SQUARES = frozenset([chess.E4, chess.D4, chess.E5, chess.D5])
+LONG_DIAG_A1H8 = frozenset([chess.A1, chess.B2, chess.C3, chess.D4, chess.E5, chess.F6, chess.G7, chess.H8])
+LONG_DIAG_A8H1 = frozenset([chess.A8, chess.B7, chess.C6, chess.D5, chess.E4, chess.F3, chess.G2, chess.H1])
+FIANCHETTO_SQUARES = frozenset([chess.G2, chess.B2, chess.G7, chess.B7])
+CENTER_MASK = chess.BB_E4 | chess.BB_D4 | chess.BB_E5 | chess.BB_D5
+
+# Only the score and PV are used from engine output; python-chess otherwise parses
+# every field of every "info" line Stockfish sends
+ANALYSIS_INFO = chess.engine.INFO_SCORE | chess.engine.INFO_PV
+
+# Most moves of a principal variation the explanations read (and the cache keeps)
+PV_MOVES_KEPT = 5
+
+def close_at_exit(closeable):
+    """
+    Call closeable.close() when the interpreter shuts down.
+    
+    Every python-chess engine runs its I/O on a non-daemon thread, and the interpreter
+    waits for those threads before it runs atexit handlers, so an engine quit from an
+    atexit handler would hang shutdown instead. CPython's threading module has a hook
+    that runs before that wait; it is private, so atexit is the fallback without it.
+    """
+    register = getattr(threading, "_register_atexit", None) or atexit.register
+    register(closeable.close)
 
 class ChessDoctor:
-    def __init__(self, stockfish_path=None):
-        """Initialize the chess analyzer with Stockfish engine."""
+    # Process-wide instance handed out by shared()
+    _shared = None
+    
+    def __init__(self, stockfish_path=None, fast_mode=False, threads=1, hash_mb=64):
+        """
+        Initialize the chess analyzer with Stockfish engine.
+        
+        Args:
+            stockfish_path: Path to the Stockfish executable (auto-detected if not provided)
+            fast_mode: Check each flagged move with a quick search first, and only run the
+                deep multipv analysis when the engine prefers a different move. Off by
+                default: the quick search is shallower than the one that flagged the move,
+                so it can end up calling an inaccuracy or mistake the best move
+            threads: Number of Stockfish search threads; a process running several engines
+                should split its CPUs between them
+            hash_mb: Size of the Stockfish hash table in MB
+        """
         # Try to find Stockfish in common locations if not provided
         if not stockfish_path:
             stockfish_path = self._find_stockfish()
@@ -18,6 +70,9 @@ class ChessDoctor:
             
         self.engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
         
+        # Stockfish defaults to a single thread and a 16 MB hash
+        self.engine.configure({"Threads": threads, "Hash": hash_mb})
+        
         # Configure analysis settings
         self.depth = 22
         self.time_limit = 0.5  # seconds per position
@@ -27,11 +82,61 @@ class ChessDoctor:
         self.mistake_threshold = -100  # -1 pawn or worse
         self.inaccuracy_threshold = -50  # -0.5 pawn or worse
         
+        # The label for a score difference at or below each threshold, in ascending order
+        self._labels = ("blunder", "mistake", "inaccuracy", "good move")
+        
+        # Most positional reasons listed in one explanation
+        self.max_explanation_factors = 3
+        
         # For full analysis, we need a deeper search
         self.deep_analysis_depth = 30
         self.deep_analysis_time = 2.0  # seconds per position for deep analysis
+        
+        # Quick first pass used to skip the deep analysis when the played move is best
+        self.fast_mode = fast_mode
+        self.fast_analysis_depth = 12
+        self.fast_analysis_time = 0.1
+        
+        # Transposition table of engine results (score and the start of the PV), keyed by
+        # position and search limit. Analyzers live as long as their process, so it stays small
+        self._tt = {}
+        self.tt_max_entries = 4096  # oldest entries are evicted first
+
+        
+        # The game currently being analyzed, used to tell the engine about new games
+        self._game = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        """Shut down the Stockfish process."""
+        self.engine.quit()
+    
+    def is_running(self):
+        """Whether the Stockfish process is still up (it may have crashed or been killed)."""
+        return not self.engine.protocol.returncode.done()
+    
+    @classmethod
+    def shared(cls, stockfish_path=None, **kwargs):
+        """
+        Return an analyzer shared by the whole process, starting it on first use.
+        
+        Starting Stockfish and loading its network takes a noticeable fraction of a
+        second, so callers analyzing many games should reuse one engine. Keyword
+        arguments are passed to the constructor when the analyzer is created.
+        """
+        if cls._shared is None:
+            cls._shared = cls(stockfish_path, **kwargs)
+            close_at_exit(cls._shared)
+        return cls._shared
     
-    def _find_stockfish(self):
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _find_stockfish():
         """Attempt to locate Stockfish executable in common locations."""
         common_locations = [
             "stockfish",  # If it's in PATH
@@ -48,45 +153,58 @@ class ChessDoctor:
             os.path.join(os.path.dirname(os.path.abspath(__file__)), "stockfish")  # Same directory as script
         ]
         
-        # Try using 'which' or 'where' command to find stockfish
-        try:
-            # On Unix-like systems
-            if sys.platform != "win32":
-                import subprocess
-                result = subprocess.run(["which", "stockfish"], 
-                                       stdout=subprocess.PIPE, 
-                                       stderr=subprocess.PIPE,
-                                       text=True)
-                if result.returncode == 0:
-                    path = result.stdout.strip()
-                    if path and os.path.exists(path):
-                        return path
-            else:
-                # On Windows
-                result = subprocess.run(["where", "stockfish"], 
-                                       stdout=subprocess.PIPE, 
-                                       stderr=subprocess.PIPE,
-                                       text=True)
-                if result.returncode == 0:
-                    path = result.stdout.strip().split('\n')[0]  # Take first result
-                    if path and os.path.exists(path):
-                        return path
-        except Exception:
-            # If 'which' or 'where' fails, continue with the common locations
-            pass
-        
+        # shutil.which searches PATH for bare names and checks that explicit
+        # paths are executable files, without having to start the engine
         for location in common_locations:
-            try:
-                # Check if we can start the engine
-                engine = chess.engine.SimpleEngine.popen_uci(location)
-                engine.quit()
-                print(f"Found Stockfish at: {location}")
-                return location
-            except (chess.engine.EngineTerminatedError, FileNotFoundError):
-                continue
+            path = shutil.which(location)
+            if path:
+                print(f"Found Stockfish at: {path}")
+                return path
                 
         return None
     
+    def _analyse_cached(self, board, limit, multipv=None):
+        """Run an engine analysis, reusing the result if this position was already searched."""
+        key = self._cache_key(board, limit, multipv)
+        result = self._tt.get(key)
+        if result is None:
+            result = self._cache_store(
+                key, self.engine.analyse(board, limit, multipv=multipv, info=ANALYSIS_INFO, game=self._game)
+            )
+        return result
+    
+    def _cache_key(self, board, limit, multipv=None):
+        """Key for the transposition table: the position plus the search it was analysed with."""
+        return (chess.polyglot.zobrist_hash(board), limit.depth, limit.time, multipv)
+    
+    def _cache_store(self, key, result):
+        """
+        Remember an analysis (an info dict, or a list of them for multipv) and return what was kept.
+        
+        Only the score and the first PV_MOVES_KEPT moves of the PV are stored; the oldest
+        entry is evicted when the table is full.
+        """
+        if isinstance(result, list):
+            result = [self._trim_info(info) for info in result]
+        else:
+            result = self._trim_info(result)
+        
+        # FIFO eviction: dicts keep insertion order, so the first key is the oldest
+        if len(self._tt) >= self.tt_max_entries:
+            del self._tt[next(iter(self._tt))]
+        self._tt[key] = result
+        return result
+    
+    @staticmethod
+    def _trim_info(info):
+        """The parts of an engine info dict the explanations read."""
+        trimmed = {}
+        if "score" in info:
+            trimmed["score"] = info["score"]
+        if "pv" in info:
+            trimmed["pv"] = info["pv"][:PV_MOVES_KEPT]
+        return trimmed
+    
     def _get_principal_variation(self, board, pv_moves, max_depth=4):
         """
         Extract and format the principal variation (expected line of play).
@@ -102,43 +220,58 @@ class ChessDoctor:
         if not pv_moves:
             return ""
             
-        # Create a copy of the board to avoid modifying the original
-        board_copy = board.copy()
+        # Limit the depth of the line
+        pv_moves = pv_moves[:max_depth]
+        
+        # python-chess formats the whole line in one call ("2. Nf3 Nc6"); keep our
+        # compact numbering ("2.Nf3 Nc6") that the web UI already parses
+        try:
+            return board.variation_san(pv_moves).replace(". ", ".")
+        except ValueError:
+            # An illegal move in the line; format the legal part move by move below
+            pass
         
         # Format the principal variation
         pv_line = []
-        move_number = board_copy.fullmove_number
-        is_white_to_move = board_copy.turn == chess.WHITE
+        move_number = board.fullmove_number
+        is_white_to_move = board.turn == chess.WHITE
         
-        # Limit the depth of the line
-        pv_moves = pv_moves[:max_depth]
+        # Move number prefix, only rebuilt when the number changes
+        number_prefix = f"{move_number}."
         
-        for i, move in enumerate(pv_moves):
-            try:
-                # Format move with proper numbering
-                if is_white_to_move or i == 0:
-                    # Start a new move pair with number for white's move or first move in line
-                    san_move = board_copy.san(move)
-                    if is_white_to_move:
-                        pv_line.append(f"{move_number}.{san_move}")
+        # Moves are played on the board itself and taken back at the end
+        pushed = 0
+        try:
+            for i, move in enumerate(pv_moves):
+                try:
+                    # Format move with proper numbering
+                    if is_white_to_move or i == 0:
+                        # Start a new move pair with number for white's move or first move in line
+                        san_move = board.san(move)
+                        if is_white_to_move:
+                            pv_line.append(number_prefix + san_move)
+                        else:
+                            pv_line.append(number_prefix + ".." + san_move)
                     else:
-                        pv_line.append(f"{move_number}...{san_move}")
-                else:
-                    # Just add black's move without number
-                    san_move = board_copy.san(move)
-                    pv_line.append(san_move)
-                
-                # Make the move on our copy board
-                board_copy.push(move)
-                
-                # Update move number and turn
-                is_white_to_move = board_copy.turn == chess.WHITE
-                if is_white_to_move:
-                    move_number += 1
+                        # Just add black's move without number
+                        san_move = board.san(move)
+                        pv_line.append(san_move)
+                    
+                    board.push(move)
+                    pushed += 1
                     
-            except Exception as e:
-                # If there's an error with this move, stop adding to the line
-                break
+                    # Update move number and turn; sides strictly alternate
+                    is_white_to_move = not is_white_to_move
+                    if is_white_to_move:
+                        move_number += 1
+                        number_prefix = f"{move_number}."
+                        
+                except Exception as e:
+                    # If there's an error with this move, stop adding to the line
+                    break
+        finally:
+            for _ in range(pushed):
+                board.pop()
                 
         # Join the formatted moves
         return " ".join(pv_line)
@@ -146,8 +279,28 @@ class ChessDoctor:
     def _get_best_move_and_explanation(self, board, played_move=None):
         """Get the best move and explanation for the current position."""
         try:
+            # In fast mode, a quick search that agrees with the played move makes the
+            # expensive multipv analysis unnecessary
+            if self.fast_mode and played_move:
+                # During game analysis the position was already evaluated, and that
+                # search's best line answers the question without another engine call
+                quick_info = self._tt.get(self._evaluation_key(board))
+                if quick_info is None or not quick_info.get("pv"):
+                    quick = self.engine.play(
+                        board,
+                        chess.engine.Limit(depth=self.fast_analysis_depth, time=self.fast_analysis_time),
+                        info=ANALYSIS_INFO,
+                        game=self._game
+                    )
+                    quick_info = dict(quick.info, pv=quick.info.get("pv", [quick.move]))
+                quick_pv = quick_info["pv"]
+                if quick_pv[0] == played_move and "score" in quick_info:
+                    explanation = self._analyze_best_move_strength(board, played_move, quick_pv[1:])
+                    best_moves = [(played_move, quick_info["score"].white())]
+                    return played_move, best_moves, explanation, self._get_principal_variation(board, quick_pv)
+            
             # Get a deeper analysis for important positions
-            result = self.engine.analyse(
+            result = self._analyse_cached(
                 board, 
                 chess.engine.Limit(depth=self.deep_analysis_depth, time=self.deep_analysis_time),
                 multipv=3  # Get top 3 best moves
@@ -184,19 +337,28 @@ class ChessDoctor:
             best_move, best_score = best_moves[0]
             best_pv = best_pv_lines[0] if best_pv_lines else ""
             
-            # Prepare explanation
-            san_best = board.san(best_move)
-            san_played = board.san(played_move)
-            
-            # First, get the position after the played move
-            board_after_played = board.copy()
-            board_after_played.push(played_move)
-            played_position_score = self._get_position_evaluation(board_after_played)
+            # SAN is only computed by the branches that use it; the PV scan below
+            # produces the best move's SAN as a by-product
+            san_best = None
             
-            # Then, get the position after the best move
-            board_after_best = board.copy()
-            board_after_best.push(best_move)
-            best_position_score = self._get_position_evaluation(board_after_best)
+            # The multipv search already scored the best move (and the played move, if it
+            # is among the top lines), so only search again when the played move is unknown
+            best_position_score = result[0]["score"]
+            if played_move_index is not None:
+                played_position_score = result[played_move_index]["score"]
+            else:
+                board.push(played_move)
+                try:
+                    # Game analysis has usually evaluated the resulting position already
+                    played_info = self._tt.get(self._evaluation_key(board))
+                    if played_info is None:
+                        played_info = self._analyse_cached(
+                            board,
+                            chess.engine.Limit(depth=12, time=0.2)
+                        )
+                    played_position_score = played_info["score"]
+                finally:
+                    board.pop()
             
             # Calculate the difference
             is_white_to_move = board.turn == chess.WHITE
@@ -221,43 +383,57 @@ class ChessDoctor:
                 context["pv_info"] = result[0]["pv"]
                 
                 # Analyze the PV to find captures and checks
-                board_copy = board.copy()
-                current_turn = board_copy.turn
+                player_turn = board.turn
+                pushed = 0
                 
-                for i, pv_move in enumerate(result[0]["pv"][:4]):  # Look at first 4 moves
-                    is_player_turn = (current_turn == board.turn)
-                    san_pv_move = board_copy.san(pv_move)
-                    
-                    # Check for captures
-                    if board_copy.is_capture(pv_move):
-                        captured = self._get_captured_piece_name(board_copy, pv_move)
-                        context["captures_in_pv"].append({
-                            "move_index": i,
-                            "is_player": is_player_turn,
-                            "piece": captured,
-                            "san": san_pv_move
-                        })
-                    
-                    # Check for checks
-                    if "+" in san_pv_move:
-                        context["checks_in_pv"].append({
-                            "move_index": i,
-                            "is_player": is_player_turn,
-                            "san": san_pv_move
-                        })
-                    
-                    # Make the move and switch turns
-                    board_copy.push(pv_move)
-                    current_turn = board_copy.turn
+                try:
+                    for i, pv_move in enumerate(result[0]["pv"][:4]):  # Look at first 4 moves
+                        is_player_turn = (board.turn == player_turn)
+                        san_pv_move = board.san(pv_move)
+                        if i == 0:
+                            san_best = san_pv_move
+                        
+                        # Check for captures
+                        if board.is_capture(pv_move):
+                            captured = self._get_captured_piece_name(board, pv_move)
+                            context["captures_in_pv"].append({
+                                "move_index": i,
+                                "is_player": is_player_turn,
+                                "piece": captured,
+                                "san": san_pv_move
+                            })
+                        
+                        # Check for checks
+                        if "+" in san_pv_move:
+                            context["checks_in_pv"].append({
+                                "move_index": i,
+                                "is_player": is_player_turn,
+                                "san": san_pv_move
+                            })
+                        
+                        # Make the move and switch turns
+                        board.push(pv_move)
+                        pushed += 1
+                finally:
+                    # Take back the PV moves that were played
+                    for _ in range(pushed):
+                        board.pop()
                 
+            # The absolute best move is described by the best move's SAN alone
+            if played_move_index != 0:
+                if san_best is None:
+                    san_best = board.san(best_move)
+                san_played = board.san(played_move)
+            
             # Build explanation based on the context
             if is_played_move_top:
                 if played_move_index == 0:
                     # It's the absolute best move
-                    explanation = self._analyze_best_move_strength(board, played_move)
+                    explanation = self._analyze_best_move_strength(board, played_move, result[0].get("pv", [])[1:], san_best)
                 else:
                     # It's among the top moves but not the absolute best
-                    explanation = self._analyze_good_alternative(board, played_move, best_move, best_score, played_position_score)
+                    explanation = self._analyze_good_alternative(board, played_move, best_move, best_score, played_position_score,
+                                                                 san_played, san_best)
             else:
                 # Get tactical themes based on position and score difference
                 missed_opportunities = []
@@ -273,7 +449,7 @@ class ChessDoctor:
                                 missed_opportunities.append("an immediate capture")
                         
                         # Check if there are legal captures that weren't played
-                        elif any(board.is_capture(move) for move in board.legal_moves) and not board.is_capture(played_move):
+                        elif not board.is_capture(played_move) and next(board.generate_legal_captures(), None) is not None:
                             missed_opportunities.append("a capture opportunity")
                         
                         # Check if the PV line shows a forced material gain through a sequence
@@ -315,18 +491,19 @@ class ChessDoctor:
                                     missed_opportunities.append("a tactical sequence with check")
                                 elif len(context["pv_info"]) >= 3:
                                     # Look deeper into the evaluation to better characterize the advantage
-                                    board_copy = board.copy()
                                     # Apply the first few moves of the PV to see the resulting position
-                                    for i, pv_move in enumerate(context["pv_info"][:3]):
-                                        board_copy.push(pv_move)
+                                    for pv_move in context["pv_info"][:3]:
+                                        board.push(pv_move)
                                     
                                     # Get evaluation after the sequence
                                     try:
-                                        result = self.engine.analyse(
-                                            board_copy, 
-                                            chess.engine.Limit(depth=18, time=0.2)
+                                        followup = self.engine.analyse(
+                                            board, 
+                                            chess.engine.Limit(depth=18, time=0.2),
+                                            info=ANALYSIS_INFO,
+                                            game=self._game
                                         )
-                                        final_score = result["score"].white().score()
+                                        final_score = followup["score"].white().score(mate_score=100000)
                                         
                                         # Determine magnitude of advantage
                                         if abs(final_score) > 500:  # More than 5 pawns
@@ -335,8 +512,11 @@ class ChessDoctor:
                                             missed_opportunities.append("a winning tactical opportunity")
                                         else:
                                             missed_opportunities.append("a strong positional improvement")
-                                    except Exception:
+                                    except chess.engine.EngineError:
                                         missed_opportunities.append("a stronger tactical move")
+                                    finally:
+                                        for _ in range(3):
+                                            board.pop()
                                 else:
                                     missed_opportunities.append("a stronger positional move")
                         else:
@@ -346,11 +526,8 @@ class ChessDoctor:
                     pass
                 
                 # Check for tactical themes
-                try:
-                    if "+" in san_best:
-                        missed_opportunities.append("a check")
-                except Exception:
-                    pass
+                if "+" in san_best:
+                    missed_opportunities.append("a check")
                 
                 # Generate explanation based on themes
                 if missed_opportunities:
@@ -364,7 +541,10 @@ class ChessDoctor:
                 else:
                     # Enhanced positional analysis when no tactical themes are found
                     try:
-                        positional_factors = self._analyze_positional_differences(board, played_move, best_move)
+                        positional_factors = self._analyze_positional_differences(board, played_move, best_move,
+                                                                                   san_played, san_best,
+                                                                                   best_pv=result[0].get("pv"),
+                                                                                   best_score=best_position_score)
                         
                         if positional_factors:
                             explanation = f"{san_best} is better than {san_played} because it {positional_factors}."
@@ -419,7 +599,7 @@ class ChessDoctor:
             if played_move and board:
                 try:
                     # Try to get the best move directly from Stockfish with minimal analysis
-                    result = self.engine.play(board, chess.engine.Limit(depth=10, time=0.1))
+                    result = self.engine.play(board, chess.engine.Limit(depth=10, time=0.1), game=self._game)
                     best_move = result.move
                     
                     if best_move:
@@ -433,27 +613,20 @@ class ChessDoctor:
             # If all else fails
             raise Exception(f"Unable to analyze position: {str(e)}")
     
-    def _analyze_best_move_strength(self, board, move):
-        """Analyze why a move is the absolute best move."""
+    def _analyze_best_move_strength(self, board, move, pv_line=None, san_move=None):
+        """
+        Analyze why a move is the absolute best move.
+        
+        Args:
+            board: The chess board position before the move
+            move: The best move
+            pv_line: The expected continuation after the move, taken from the
+                engine analysis that found it
+            san_move: The move in SAN, if the caller already computed it
+        """
         try:
-            san_move = board.san(move)
-            
-            # Look for tactical or positional themes
-            board_after = board.copy()
-            board_after.push(move)
-            
-            # Get a longer line to see what this move enables
-            pv_line = []
-            try:
-                result = self.engine.analyse(
-                    board_after, 
-                    chess.engine.Limit(depth=18, time=0.3),
-                    multipv=1
-                )
-                if result and len(result) > 0 and "pv" in result[0]:
-                    pv_line = result[0]["pv"]
-            except Exception:
-                pass
+            if san_move is None:
+                san_move = board.san(move)
             
             # Check for special tactical patterns
             if "+" in san_move:
@@ -469,10 +642,17 @@ class ChessDoctor:
             # Look at the next moves in the line
             if pv_line and len(pv_line) >= 2:
                 next_move = pv_line[0]
-                if board_after.is_capture(next_move):
+                board.push(move)
+                try:
+                    next_is_capture = board.is_capture(next_move)
+                    next_is_check = "+" in board.san(next_move)
+                finally:
+                    board.pop()
+                
+                if next_is_capture:
                     return f"Excellent! {san_move} is the best move, setting up a strong capture on the next move."
                 
-                if "+" in board_after.san(next_move):
+                if next_is_check:
                     return f"Perfect! {san_move} is the best move, preparing a strong check on the next move."
             
             # If no clear tactical pattern, analyze the position
@@ -483,22 +663,27 @@ class ChessDoctor:
             # Generic fallback for best move
             return f"Excellent! {san_move} is the best move, giving you the strongest position."
             
-        except Exception as e:
-            # Fallback
+        except chess.IllegalMoveError:
+            # The engine line didn't match this position
             return f"Excellent! This is the strongest move in the position."
     
-    def _analyze_good_alternative(self, board, played_move, best_move, best_score, played_score):
+    def _analyze_good_alternative(self, board, played_move, best_move, best_score, played_score,
+                                  san_played=None, san_best=None):
         """Analyze a move that's good but not the absolute best."""
         try:
-            san_played = board.san(played_move)
-            san_best = board.san(best_move)
+            # SAN is only computed here if the caller didn't pass it in
+            if san_played is None:
+                san_played = board.san(played_move)
+            if san_best is None:
+                san_best = board.san(best_move)
             
             # Calculate how close this move is to the best move
             # For score comparison, we need to get the score values, not the PovScore objects
-            try:
-                played_cp = played_score.white().score()
-                best_cp = best_score.score()
-                
+            played_cp = played_score.white().score()
+            best_cp = best_score.score()
+            
+            # Mate scores have no centipawn value to compare
+            if played_cp is not None and best_cp is not None:
                 # If the scores are very close (within 0.2 pawns)
                 if abs(played_cp - best_cp) < 20:
                     # Practically equal
@@ -513,13 +698,8 @@ class ChessDoctor:
                     if position_strengths:
                         return f"{san_played} is a strong alternative to {san_best}, {position_strengths}."
                     return f"{san_played} is a strong alternative to the top engine choice ({san_best})."
-            except Exception:
-                pass
             
             # If we can't compare scores or they're not very close, do a positional comparison
-            board_after_played = board.copy()
-            board_after_played.push(played_move)
-            
             position_strengths = self._analyze_positional_strengths(board, played_move)
             if position_strengths:
                 return f"{san_played} is among the top choices, {position_strengths}."
@@ -531,8 +711,8 @@ class ChessDoctor:
             # Generic fallback
             return f"{san_played} is among the top choices in this position."
             
-        except Exception as e:
-            # Fallback
+        except chess.IllegalMoveError:
+            # The moves don't fit this position
             return f"This is among the strongest options in this position."
     
     def _get_captured_piece_name(self, board, move):
@@ -561,186 +741,180 @@ class ChessDoctor:
         
         return piece_names.get(piece.piece_type)
     
-    def _analyze_pv_for_captures(self, board, pv_moves, player_color):
-        """Analyze the PV line to determine if there are player-initiated captures."""
-        if not pv_moves:
-            return False, None
-            
-        board_copy = board.copy()
-        current_turn = board_copy.turn
+    def _analyze_positional_strengths(self, board, move, *, board_after=None):
+        """
+        Analyze the positional strengths of a move.
+        
+        Args:
+            board: The chess board position before the move
+            move: The move to describe
+            board_after: The position after the move, if the caller already has one;
+                otherwise the move is played on board and taken back before returning
+        """
+        # Use our existing analysis, but only return the explanation, not update factors
+        factors = []
+        
+        # Get piece types
+        piece = board.piece_at(move.from_square)
+        if not piece:
+            return None
+        
+        player_color = board.turn
+        
+        # Knight, rook and queen checks look at the position after the move
+        pushed = board_after is None and piece.piece_type in (chess.KNIGHT, chess.ROOK, chess.QUEEN)
+        if pushed:
+            board.push(move)
+            board_after = board
         
-        # Only check the first few moves to keep it relevant
-        for i, move in enumerate(pv_moves[:4]):
-            # If it's the player's turn and the move is a capture
-            if current_turn == player_color and board_copy.is_capture(move):
-                captured_piece = self._get_captured_piece_name(board_copy, move)
-                return True, captured_piece
-                
-            # Make the move and switch turns
-            board_copy.push(move)
-            current_turn = board_copy.turn
-                
-        return False, None
-    
-    def _analyze_positional_strengths(self, board, move):
-        """Analyze the positional strengths of a move."""
         try:
-            # Use our existing analysis, but only return the explanation, not update factors
-            factors = []
-            
-            board_after = board.copy()
-            board_after.push(move)
-            
-            # Get piece types
-            piece = board.piece_at(move.from_square)
-            if not piece:
-                return None
-            
-            player_color = board.turn
-            
             # Check common positional strengths based on piece type
-            if piece.piece_type == chess.PAWN:
-                # Check for pawn advances
-                if player_color == chess.WHITE and chess.square_rank(move.to_square) >= 5:
-                    factors.append("advancing a pawn toward promotion")
-                elif player_color == chess.BLACK and chess.square_rank(move.to_square) <= 2:
-                    factors.append("advancing a pawn toward promotion")
-                    
-                # Check for center control with pawns
-                if move.to_square in [chess.parse_square(s) for s in ["d4", "e4", "d5", "e5"]]:
-                    factors.append("controlling the center with a pawn")
-            
-            elif piece.piece_type == chess.KNIGHT:
-                # Check for knight outposts
-                if self._is_outpost(board_after, move.to_square, player_color):
-                    factors.append("placing your knight on a strong outpost")
-                    
-                # Check for knight fork potential
-                attack_count = 0
-                for square in range(64):
-                    target_piece = board_after.piece_at(square)
-                    if target_piece and target_piece.color != player_color:
-                        if board_after.is_attacked_by(player_color, square):
-                            attack_count += 1
-                
-                if attack_count >= 2:
-                    factors.append("creating knight pressure on multiple pieces")
-            
-            elif piece.piece_type == chess.BISHOP:
-                # Check for bishop on long diagonal
-                long_diagonals = [
-                    [chess.parse_square(s) for s in ["a1", "b2", "c3", "d4", "e5", "f6", "g7", "h8"]],
-                    [chess.parse_square(s) for s in ["a8", "b7", "c6", "d5", "e4", "f3", "g2", "h1"]]
-                ]
-                
-                for diagonal in long_diagonals:
-                    if move.to_square in diagonal:
-                        factors.append("placing your bishop on a powerful long diagonal")
-                        break
-                
-                # Check for fianchetto
-                fianchetto_squares = [
-                    chess.parse_square("g2"), chess.parse_square("b2"),
-                    chess.parse_square("g7"), chess.parse_square("b7")
-                ]
-                
-                if move.to_square in fianchetto_squares:
-                    factors.append("fianchettoing your bishop")
-            
-            elif piece.piece_type == chess.ROOK:
-                # Check for rook on open file
-                if self._check_file_control(board_after, move, player_color):
-                    factors.append("placing your rook on an open file")
-                
-                # Check for rook on 7th rank
-                if player_color == chess.WHITE and chess.square_rank(move.to_square) == 6:
-                    factors.append("placing your rook on the 7th rank")
-                elif player_color == chess.BLACK and chess.square_rank(move.to_square) == 1:
-                    factors.append("placing your rook on the 7th rank")
-            
-            elif piece.piece_type == chess.QUEEN:
-                # Check for queen activity
-                attack_count = 0
-                for square in range(64):
-                    if board_after.is_attacked_by(player_color, square):
-                        attack_count += 1
-                
-                if attack_count >= 16:
-                    factors.append("maximizing your queen's activity")
-            
-            elif piece.piece_type == chess.KING:
-                # Check for castling
-                if board.is_castling(move):
-                    if chess.square_file(move.to_square) < 4:
-                        factors.append("castling queenside for king safety")
-                    else:
-                        factors.append("castling kingside for king safety")
-                
-                # Check for king activity in endgame
-                if self._is_endgame(board):
-                    central_distance = self._distance_to_center(move.to_square)
-                    if central_distance <= 2:
-                        factors.append("centralizing your king in the endgame")
-            
-            # If we found factors, format them into a natural explanation
-            if factors:
-                if len(factors) == 1:
-                    return factors[0]
-                elif len(factors) == 2:
-                    return f"{factors[0]} and {factors[1]}"
-                else:
-                    return f"{', '.join(factors[:-1])}, and {factors[-1]}"
+            handler = self._STRENGTH_HANDLERS.get(piece.piece_type)
+            if handler:
+                factors.extend(handler(self, board, board_after, move, player_color))
+        finally:
+            if pushed:
+                board.pop()
+        
+        # If we found factors, format them into a natural explanation
+        if factors:
+            if len(factors) == 1:
+                return factors[0]
+            elif len(factors) == 2:
+                return f"{factors[0]} and {factors[1]}"
+            else:
+                return f"{', '.join(factors[:-1])}, and {factors[-1]}"
+        
+        return None
+    
+    def _pawn_strengths(self, board, board_after, move, player_color):
+        """Positional strengths of a pawn move."""
+        factors = []
+        
+        # Check for pawn advances
+        if player_color == chess.WHITE and chess.square_rank(move.to_square) >= 5:
+            factors.append("advancing a pawn toward promotion")
+        elif player_color == chess.BLACK and chess.square_rank(move.to_square) <= 2:
+            factors.append("advancing a pawn toward promotion")
+            
+        # Check for center control with pawns
+        if move.to_square in CENTER_SQUARES:
+            factors.append("controlling the center with a pawn")
+        
+        return factors
+    
+    def _knight_strengths(self, board, board_after, move, player_color):
+        """Positional strengths of a knight move."""
+        factors = []
+        
+        # Check for knight outposts
+        if self._is_outpost(board_after, move.to_square, player_color):
+            factors.append("placing your knight on a strong outpost")
             
-            return None
-        except Exception:
-            return None
+        # Check for knight fork potential
+        attacked_pieces = board_after.attacks_mask(move.to_square) & board_after.occupied_co[not player_color]
+        
+        if chess.popcount(attacked_pieces) >= 2:
+            factors.append("creating knight pressure on multiple pieces")
+        
+        return factors
+    
+    def _bishop_strengths(self, board, board_after, move, player_color):
+        """Positional strengths of a bishop move."""
+        factors = []
+        
+        # Check for bishop on long diagonal
+        if move.to_square in LONG_DIAG_A1H8 or move.to_square in LONG_DIAG_A8H1:
+            factors.append("placing your bishop on a powerful long diagonal")
+        
+        # Check for fianchetto
+        if move.to_square in FIANCHETTO_SQUARES:
+            factors.append("fianchettoing your bishop")
+        
+        return factors
+    
+    def _rook_strengths(self, board, board_after, move, player_color):
+        """Positional strengths of a rook move."""
+        factors = []
+        
+        # Check for rook on open file
+        if self._check_file_control(board_after, move, player_color):
+            factors.append("placing your rook on an open file")
+        
+        # Check for rook on 7th rank
+        if player_color == chess.WHITE and chess.square_rank(move.to_square) == 6:
+            factors.append("placing your rook on the 7th rank")
+        elif player_color == chess.BLACK and chess.square_rank(move.to_square) == 1:
+            factors.append("placing your rook on the 7th rank")
+        
+        return factors
+    
+    def _queen_strengths(self, board, board_after, move, player_color):
+        """Positional strengths of a queen move."""
+        factors = []
+        
+        # Check for queen activity
+        if chess.popcount(self._attacked_mask(board_after, player_color)) >= 16:
+            factors.append("maximizing your queen's activity")
+        
+        return factors
+    
+    def _king_strengths(self, board, board_after, move, player_color):
+        """Positional strengths of a king move."""
+        factors = []
+        
+        # Check for castling
+        if board.is_castling(move):
+            if chess.square_file(move.to_square) < 4:
+                factors.append("castling queenside for king safety")
+            else:
+                factors.append("castling kingside for king safety")
+        
+        # Check for king activity in endgame
+        if self._is_endgame(board):
+            central_distance = self._distance_to_center(move.to_square)
+            if central_distance <= 2:
+                factors.append("centralizing your king in the endgame")
+        
+        return factors
+    
+    # Piece type -> positional strength check, used by _analyze_positional_strengths
+    _STRENGTH_HANDLERS = {
+        chess.PAWN: _pawn_strengths,
+        chess.KNIGHT: _knight_strengths,
+        chess.BISHOP: _bishop_strengths,
+        chess.ROOK: _rook_strengths,
+        chess.QUEEN: _queen_strengths,
+        chess.KING: _king_strengths
+    }
     
     def _is_similar_move_type(self, board, move1, move2):
         """Check if two moves are similar in type (e.g., both captures, both checks)."""
-        try:
-            # Check if both are captures
-            both_captures = board.is_capture(move1) and board.is_capture(move2)
-            
-            # Check if both are checks
-            board_after1 = board.copy()
-            board_after1.push(move1)
-            is_check1 = board_after1.is_check()
-            
-            board_after2 = board.copy()
-            board_after2.push(move2)
-            is_check2 = board_after2.is_check()
-            
-            both_checks = is_check1 and is_check2
-            
-            # Check if both are by the same piece type
-            piece1 = board.piece_at(move1.from_square)
-            piece2 = board.piece_at(move2.from_square)
-            same_piece_type = piece1 and piece2 and piece1.piece_type == piece2.piece_type
-            
-            # Check if both go to a similar area (e.g., both to the center)
-            to_square1 = move1.to_square
-            to_square2 = move2.to_square
-            similar_destination = (abs(chess.square_file(to_square1) - chess.square_file(to_square2)) <= 1 and
-                                  abs(chess.square_rank(to_square1) - chess.square_rank(to_square2)) <= 1)
-            
-            return both_captures or both_checks or (same_piece_type and similar_destination)
-        except Exception:
-            return False
+        # Check if both are captures
+        both_captures = board.is_capture(move1) and board.is_capture(move2)
+        
+        # Check if both are checks
+        both_checks = board.gives_check(move1) and board.gives_check(move2)
+        
+        # Check if both are by the same piece type
+        piece1 = board.piece_at(move1.from_square)
+        piece2 = board.piece_at(move2.from_square)
+        same_piece_type = piece1 and piece2 and piece1.piece_type == piece2.piece_type
+        
+        # Check if both go to a similar area (e.g., both to the center)
+        to_square1 = move1.to_square
+        to_square2 = move2.to_square
+        similar_destination = (abs(chess.square_file(to_square1) - chess.square_file(to_square2)) <= 1 and
+                              abs(chess.square_rank(to_square1) - chess.square_rank(to_square2)) <= 1)
+        
+        return both_captures or both_checks or (same_piece_type and similar_destination)
     
     def _is_endgame(self, board):
         """Determine if the position is likely in the endgame phase."""
         # Simple heuristic: count major pieces
-        white_major_pieces = 0
-        black_major_pieces = 0
-        
-        for square in range(64):
-            piece = board.piece_at(square)
-            if piece:
-                if piece.piece_type in [chess.QUEEN, chess.ROOK]:
-                    if piece.color == chess.WHITE:
-                        white_major_pieces += 1
-                    else:
-                        black_major_pieces += 1
+        major_pieces = board.queens | board.rooks
+        white_major_pieces = chess.popcount(major_pieces & board.occupied_co[chess.WHITE])
+        black_major_pieces = chess.popcount(major_pieces & board.occupied_co[chess.BLACK])
         
         # Endgame if both sides have 0-1 major pieces
         return white_major_pieces <= 1 and black_major_pieces <= 1
@@ -759,212 +933,58 @@ class ChessDoctor:
         # Manhattan distance
         return file_distance + rank_distance
     
-    def _analyze_positional_differences(self, board, played_move, best_move):
+    def _analyze_positional_differences(self, board, played_move, best_move, san_played=None, san_best=None,
+                                        best_pv=None, best_score=None):
         """Analyze positional differences between played move and best move."""
         try:
-            # Create boards for after the played move and after the best move
-            board_after_played = board.copy()
+            # Both resulting positions are compared side by side, so these need their
+            # own boards; the move history is not needed for that
+            board_after_played = board.copy(stack=False)
             board_after_played.push(played_move)
             
-            board_after_best = board.copy()
+            board_after_best = board.copy(stack=False)
             board_after_best.push(best_move)
             
-            # Get piece counts for both resulting positions
-            played_white_pieces = self._count_pieces(board_after_played, chess.WHITE)
-            played_black_pieces = self._count_pieces(board_after_played, chess.BLACK)
-            best_white_pieces = self._count_pieces(board_after_best, chess.WHITE)
-            best_black_pieces = self._count_pieces(board_after_best, chess.BLACK)
-            
-            factors = []
-            
             # Whose perspective are we analyzing from
             player_color = board.turn
-            opponent_color = not player_color
             
             # For easier reference
-            san_best = board.san(best_move)
-            san_played = board.san(played_move)
-            
-            # Check if the moves are different piece types
-            piece_played = board.piece_at(played_move.from_square)
-            piece_best = board.piece_at(best_move.from_square)
-            
-            if piece_played and piece_best and piece_played.piece_type != piece_best.piece_type:
-                if piece_best.piece_type > piece_played.piece_type:  # Higher value piece is generally better
-                    factors.append(f"uses a stronger piece ({san_best.strip('+')})")
-            
-            # Look for specific piece placements
-            try:
-                # Analyze center control (e4, d4, e5, d5)
-                # Define center squares using chess.square notation
-                e4 = chess.parse_square("e4")
-                d4 = chess.parse_square("d4")
-                e5 = chess.parse_square("e5")
-                d5 = chess.parse_square("d5")
-                center_squares = [e4, d4, e5, d5]
-                
-                played_center_control = self._count_controlled_squares(board_after_played, center_squares, player_color)
-                best_center_control = self._count_controlled_squares(board_after_best, center_squares, player_color)
-                
-                # More sensitive threshold
-                if best_center_control > played_center_control:
-                    factors.append("provides better control of the center")
-                
-                # Check if the move goes to a central square
-                if best_move.to_square in center_squares and not played_move.to_square in center_squares:
-                    factors.append("occupies a central square")
-            except Exception:
-                pass  # Skip this analysis if it fails
-            
-            # Analyze piece activity and board control
-            try:
-                played_activity = self._count_squares_controlled(board_after_played, player_color)
-                best_activity = self._count_squares_controlled(board_after_best, player_color)
-                
-                # More sensitive threshold
-                if best_activity > played_activity + 2:
-                    factors.append("increases piece activity")
-            except Exception:
-                pass
-            
-            # Analyze piece development
-            try:
-                played_development = self._count_developed_pieces(board_after_played, player_color)
-                best_development = self._count_developed_pieces(board_after_best, player_color)
-                
-                # More sensitive threshold
-                if best_development > played_development:
-                    factors.append("improves piece development")
-                
-                # Check if in opening and castling is available
-                if self._is_in_opening(board) and not board.is_check():
-                    if self._move_helps_castling(board, best_move, player_color) and not self._move_helps_castling(board, played_move, player_color):
-                        factors.append("helps prepare for castling")
-            except Exception:
-                pass  # Skip this analysis if it fails
-            
-            # Check king safety
-            try:
-                played_king_safety = self._evaluate_king_safety(board_after_played, player_color)
-                best_king_safety = self._evaluate_king_safety(board_after_best, player_color)
-                
-                # More sensitive threshold
-                if best_king_safety > played_king_safety:
-                    factors.append("improves king safety")
-            except Exception:
-                pass  # Skip this analysis if it fails
-            
-            # Check pawn structure
-            try:
-                played_pawn_structure = self._evaluate_pawn_structure(board_after_played, player_color)
-                best_pawn_structure = self._evaluate_pawn_structure(board_after_best, player_color)
-                
-                # More sensitive threshold
-                if best_pawn_structure > played_pawn_structure:
-                    factors.append("creates a better pawn structure")
-                
-                # Check for pawn advances toward promotion
-                if piece_best and piece_best.piece_type == chess.PAWN:
-                    best_pawn_advance = self._evaluate_pawn_advance(best_move, player_color)
-                    played_pawn_advance = 0
-                    if piece_played and piece_played.piece_type == chess.PAWN:
-                        played_pawn_advance = self._evaluate_pawn_advance(played_move, player_color)
-                    
-                    if best_pawn_advance > played_pawn_advance:
-                        factors.append("advances a pawn closer to promotion")
-            except Exception:
-                pass  # Skip this analysis if it fails
-            
-            # Mobility (how many legal moves there are)
-            try:
-                board_after_played_copy = board_after_played.copy()
-                board_after_best_copy = board_after_best.copy()
-                
-                # Try to make a null move to switch turns
-                try:
-                    board_after_played_copy.push(chess.Move.null())
-                    played_mobility = len(list(board_after_played_copy.legal_moves))
-                    board_after_played_copy.pop()
-                except Exception:
-                    # If null move doesn't work, just count current legal moves
-                    played_mobility = len(list(board_after_played.legal_moves))
-                
-                try:
-                    board_after_best_copy.push(chess.Move.null())
-                    best_mobility = len(list(board_after_best_copy.legal_moves))
-                    board_after_best_copy.pop()
-                except Exception:
-                    best_mobility = len(list(board_after_best.legal_moves))
-                
-                # Player's mobility
-                played_own_mobility = len(list(board_after_played.legal_moves))
-                best_own_mobility = len(list(board_after_best.legal_moves))
-                if best_own_mobility > played_own_mobility + 2:
-                    factors.append("increases your mobility")
-                
-                # Opponent's mobility
-                if best_mobility < played_mobility - 2:  # Significant difference in opponent's mobility
-                    factors.append("restricts opponent's mobility")
-            except Exception:
-                pass  # Skip this analysis if it fails
-            
-            # Check if the move attacks an opponent piece
-            try:
-                if self._move_attacks_piece(board, best_move, opponent_color) and not self._move_attacks_piece(board, played_move, opponent_color):
-                    factors.append("puts pressure on opponent's pieces")
-            except Exception:
-                pass
-            
-            # Check if the move defends a piece under attack
-            try:
-                if self._move_defends_piece(board, best_move, player_color) and not self._move_defends_piece(board, played_move, player_color):
-                    factors.append("defends a vulnerable piece")
-            except Exception:
-                pass
-            
-            # Check for control of important files or diagonals
-            try:
-                best_file_control = self._check_file_control(board_after_best, best_move, player_color)
-                played_file_control = self._check_file_control(board_after_played, played_move, player_color)
-                
-                if best_file_control and not played_file_control:
-                    if self._is_piece_type(board, best_move.from_square, chess.ROOK):
-                        factors.append("controls an open file with a rook")
-                    elif self._is_piece_type(board, best_move.from_square, chess.BISHOP):
-                        factors.append("controls an important diagonal")
-                    elif self._is_piece_type(board, best_move.from_square, chess.QUEEN):
-                        factors.append("positions the queen on a strong file or diagonal")
-            except Exception:
-                pass
+            if san_best is None:
+                san_best = board.san(best_move)
+            if san_played is None:
+                san_played = board.san(played_move)
+            
+            # The checks run lazily, so they stop once there are enough reasons to list
+            factors = list(itertools.islice(
+                self._iter_positional_factors(board, board_after_played, board_after_best,
+                                              played_move, best_move, san_best),
+                self.max_explanation_factors
+            ))
             
             # If we still don't have factors, try to give some move-specific commentary
             if not factors:
-                try:
-                    # Check for knight outposts
-                    if self._is_piece_type(board, best_move.from_square, chess.KNIGHT):
-                        if self._is_outpost(board_after_best, best_move.to_square, player_color):
-                            factors.append("places the knight on a strong outpost")
-                    
-                    # Check for bishop pair
-                    if self._keeps_bishop_pair(board_after_best, player_color) and not self._keeps_bishop_pair(board_after_played, player_color):
-                        factors.append("preserves the bishop pair")
-                    
-                    # Generic piece activity
-                    piece_name = self._get_piece_name(board, best_move.from_square)
-                    if piece_name:
-                        factors.append(f"places the {piece_name} more actively")
-                except Exception:
-                    pass
+                # Check for knight outposts
+                if self._is_piece_type(board, best_move.from_square, chess.KNIGHT):
+                    if self._is_outpost(board_after_best, best_move.to_square, player_color):
+                        factors.append("places the knight on a strong outpost")
+                
+                # Check for bishop pair
+                if self._keeps_bishop_pair(board_after_best, player_color) and not self._keeps_bishop_pair(board_after_played, player_color):
+                    factors.append("preserves the bishop pair")
+                
+                # Generic piece activity
+                piece_name = self._get_piece_name(board, best_move.from_square)
+                if piece_name:
+                    factors.append(f"places the {piece_name} more actively")
             
             # If still no factors, try to analyze lines more deeply
             if not factors:
-                try:
-                    # Look for tactical possibilities in the future
-                    tactics = self._look_for_future_tactics(board_after_best, player_color)
-                    if tactics:
-                        factors.append(f"sets up {tactics} in future moves")
-                except Exception:
-                    pass
+                # Look for tactical possibilities in the future
+                # The best line already searched from this position continues after the best move
+                tactics = self._look_for_future_tactics(board_after_best, player_color,
+                                                        best_pv[1:] if best_pv else None, best_score)
+                if tactics:
+                    factors.append(f"sets up {tactics} in future moves")
             
             if factors:
                 if len(factors) == 1:
@@ -979,113 +999,203 @@ class ChessDoctor:
                 return f"gives you better long-term prospects"
             
             return None
-        except Exception:
-            # If anything fails in the overall analysis, return None
+        except chess.IllegalMoveError:
+            # The moves don't fit this position
             return None
     
-    def _count_pieces(self, board, color):
-        """Count pieces of a specific color on the board."""
-        try:
-            piece_map = board.piece_map()
-            return sum(1 for piece in piece_map.values() if piece.color == color)
-        except Exception:
-            return 0
+    def _iter_positional_factors(self, board, board_after_played, board_after_best,
+                                 played_move, best_move, san_best):
+        """Yield the reasons the best move is better than the played one, in the order they are listed."""
+        # Whose perspective are we analyzing from
+        player_color = board.turn
+        opponent_color = not player_color
+        
+        # Square control for both resulting positions
+        played_stats = self._board_stats(board_after_played, player_color)
+        best_stats = self._board_stats(board_after_best, player_color)
+        
+        # Check if the moves are different piece types
+        piece_played = board.piece_at(played_move.from_square)
+        piece_best = board.piece_at(best_move.from_square)
+        
+        if piece_played and piece_best and piece_played.piece_type != piece_best.piece_type:
+            if piece_best.piece_type > piece_played.piece_type:  # Higher value piece is generally better
+                yield f"uses a stronger piece ({san_best.strip('+')})"
+        
+        # Look for specific piece placements
+        # Analyze center control (e4, d4, e5, d5)
+        played_center_control = played_stats["center_control"]
+        best_center_control = best_stats["center_control"]
+        
+        # More sensitive threshold
+        if best_center_control > played_center_control:
+            yield "provides better control of the center"
+        
+        # Check if the move goes to a central square
+        if best_move.to_square in CENTER_SQUARES and not played_move.to_square in CENTER_SQUARES:
+            yield "occupies a central square"
+        
+        # Analyze piece activity and board control
+        played_activity = played_stats["total_control"]
+        best_activity = best_stats["total_control"]
+        
+        # More sensitive threshold
+        if best_activity > played_activity + 2:
+            yield "increases piece activity"
+        
+        # Analyze piece development
+        played_development = self._count_developed_pieces(board_after_played, player_color)
+        best_development = self._count_developed_pieces(board_after_best, player_color)
+        
+        # More sensitive threshold
+        if best_development > played_development:
+            yield "improves piece development"
+        
+        # Check if in opening and castling is available
+        if self._is_in_opening(board) and not board.is_check():
+            if self._move_helps_castling(board, best_move, player_color) and not self._move_helps_castling(board, played_move, player_color):
+                yield "helps prepare for castling"
+        
+        # Check king safety
+        played_king_safety = self._evaluate_king_safety(board_after_played, player_color,
+                                                        played_stats["opponent_attacked"])
+        best_king_safety = self._evaluate_king_safety(board_after_best, player_color,
+                                                      best_stats["opponent_attacked"])
+        
+        # More sensitive threshold
+        if best_king_safety > played_king_safety:
+            yield "improves king safety"
+        
+        # Check pawn structure
+        played_pawn_structure = self._evaluate_pawn_structure(board_after_played, player_color)
+        best_pawn_structure = self._evaluate_pawn_structure(board_after_best, player_color)
+        
+        # More sensitive threshold
+        if best_pawn_structure > played_pawn_structure:
+            yield "creates a better pawn structure"
+        
+        # Check for pawn advances toward promotion
+        if piece_best and piece_best.piece_type == chess.PAWN:
+            best_pawn_advance = self._evaluate_pawn_advance(best_move, player_color)
+            played_pawn_advance = 0
+            if piece_played and piece_played.piece_type == chess.PAWN:
+                played_pawn_advance = self._evaluate_pawn_advance(played_move, player_color)
+            
+            if best_pawn_advance > played_pawn_advance:
+                yield "advances a pawn closer to promotion"
+        
+        # Mobility (how many legal moves there are)
+        # Null-move versions of both positions, built once, to count moves for the other side
+        board_after_played_null = board_after_played.copy(stack=False)
+        board_after_best_null = board_after_best.copy(stack=False)
+        board_after_played_null.push(chess.Move.null())
+        board_after_best_null.push(chess.Move.null())
+        
+        played_mobility = board_after_played_null.legal_moves.count()
+        best_mobility = board_after_best_null.legal_moves.count()
+        
+        # Player's mobility
+        played_own_mobility = board_after_played.legal_moves.count()
+        best_own_mobility = board_after_best.legal_moves.count()
+        if best_own_mobility > played_own_mobility + 2:
+            yield "increases your mobility"
+        
+        # Opponent's mobility
+        if best_mobility < played_mobility - 2:  # Significant difference in opponent's mobility
+            yield "restricts opponent's mobility"
+        
+        # Check if the move attacks an opponent piece
+        if (self._move_attacks_piece(board_after_best, opponent_color, best_stats["attacked"]) and
+                not self._move_attacks_piece(board_after_played, opponent_color, played_stats["attacked"])):
+            yield "puts pressure on opponent's pieces"
+        
+        # Check if the move defends a piece under attack
+        threatened = self._threatened_mask(board, player_color)
+        if (threatened and
+                self._move_defends_piece(board_after_best, threatened, player_color, best_stats["attacked"]) and
+                not self._move_defends_piece(board_after_played, threatened, player_color, played_stats["attacked"])):
+            yield "defends a vulnerable piece"
+        
+        # Check for control of important files or diagonals
+        best_file_control = self._check_file_control(board_after_best, best_move, player_color)
+        played_file_control = self._check_file_control(board_after_played, played_move, player_color)
+        
+        if best_file_control and not played_file_control:
+            if self._is_piece_type(board, best_move.from_square, chess.ROOK):
+                yield "controls an open file with a rook"
+            elif self._is_piece_type(board, best_move.from_square, chess.BISHOP):
+                yield "controls an important diagonal"
+            elif self._is_piece_type(board, best_move.from_square, chess.QUEEN):
+                yield "positions the queen on a strong file or diagonal"
     
-    def _count_controlled_squares(self, board, squares, color):
-        """Count how many of the specified squares are controlled by the given color."""
-        try:
-            count = 0
-            for square in squares:
-                try:
-                    if board.is_attacked_by(color, square):
-                        count += 1
-                except Exception:
-                    continue
-            return count
-        except Exception:
-            return 0
+    def _board_stats(self, board, color):
+        """
+        Collect piece count and square control for one side of a position.
+        
+        The attack masks for both sides are kept in the result so the other
+        positional checks on the same board don't have to rebuild them.
+        """
+        attacked = self._attacked_mask(board, color)
+        
+        return {
+            "pieces": chess.popcount(board.occupied_co[color]),
+            "center_control": chess.popcount(attacked & CENTER_MASK),
+            "total_control": chess.popcount(attacked),
+            "attacked": attacked,
+            "opponent_attacked": self._attacked_mask(board, not color)
+        }
+    
+    def _attacked_mask(self, board, color):
+        """Bitboard of every square attacked by at least one piece of the given color."""
+        attacked = 0
+        for square in chess.scan_forward(board.occupied_co[color]):
+            attacked |= board.attacks_mask(square)
+        return attacked
     
     def _count_developed_pieces(self, board, color):
         """Count number of developed pieces (non-pawns moved from starting position)."""
-        try:
-            # For simplicity, we'll count pieces that are not on their original squares
-            # This is a simplified approach, not perfect
-            if color == chess.WHITE:
-                home_rank = 0  # Rank 1 (0-indexed in python-chess)
-            else:
-                home_rank = 7  # Rank 8 (0-indexed in python-chess)
-                
-            piece_map = board.piece_map()
-            developed = 0
-            
-            for square, piece in piece_map.items():
-                if (piece.color == color and 
-                    piece.piece_type != chess.PAWN and
-                    piece.piece_type != chess.KING and
-                    chess.square_rank(square) != home_rank):
-                    developed += 1
-                    
-            return developed
-        except Exception:
-            return 0
+        # For simplicity, we'll count pieces that are not on their back rank
+        # This is a simplified approach, not perfect
+        home_rank = chess.BB_RANK_1 if color == chess.WHITE else chess.BB_RANK_8
+        pieces = (board.knights | board.bishops | board.rooks | board.queens) & board.occupied_co[color]
+        return chess.popcount(pieces & ~home_rank)
     
-    def _evaluate_king_safety(self, board, color):
+    def _evaluate_king_safety(self, board, color, opponent_attacked=None):
         """Evaluate king safety as a simple metric."""
-        try:
-            # Find the king
-            king_square = board.king(color)
-            if not king_square:
-                return 0
-                
-            # Count attacking pieces near king
-            safety = 10  # Start with a base value
-            
-            # Check if king is attacked
-            if board.is_attacked_by(not color, king_square):
-                safety -= 5
-                
-            # Check squares around king
-            for offset in [-9, -8, -7, -1, 1, 7, 8, 9]:
-                try:
-                    adjacent_square = king_square + offset
-                    if 0 <= adjacent_square < 64:  # Valid square
-                        if board.is_attacked_by(not color, adjacent_square):
-                            safety -= 1
-                except Exception:
-                    continue
-                    
-            return max(0, safety)
-        except Exception:
+        # Find the king
+        king_square = board.king(color)
+        if king_square is None:
             return 0
+        
+        # Squares the opponent attacks, checked against the king and the squares around it
+        attacked = opponent_attacked
+        if attacked is None:
+            attacked = self._attacked_mask(board, not color)
+        
+        safety = 10  # Start with a base value
+        if attacked & chess.BB_SQUARES[king_square]:
+            safety -= 5
+        safety -= chess.popcount(attacked & chess.BB_KING_ATTACKS[king_square])
+        
+        return max(0, safety)
     
     def _evaluate_pawn_structure(self, board, color):
         """Evaluate pawn structure quality."""
-        try:
-            # Count doubled, isolated and passed pawns
-            pawns = [s for s, p in board.piece_map().items() 
-                    if p.piece_type == chess.PAWN and p.color == color]
-            
-            if not pawns:
-                return 0
-                
-            # Check for doubled pawns (pawns on same file)
-            files = [chess.square_file(s) for s in pawns]
-            doubled = len(files) - len(set(files))
-            
-            # Simple metric: penalize doubled pawns
-            score = 10 - (doubled * 2)
-            
-            return max(0, score)
-        except Exception:
+        pawns = board.pawns & board.occupied_co[color]
+        if not pawns:
             return 0
-    
-    def _count_squares_controlled(self, board, color):
-        """Count total number of squares controlled by a player."""
-        count = 0
-        for square in range(64):
-            if board.is_attacked_by(color, square):
-                count += 1
-        return count
+        
+        # Check for doubled pawns (pawns on same file): fold the ranks onto the
+        # first one so each occupied file leaves a single bit
+        files = pawns | (pawns >> 32)
+        files |= files >> 16
+        files |= files >> 8
+        doubled = chess.popcount(pawns) - chess.popcount(files & chess.BB_RANK_1)
+        
+        # Simple metric: penalize doubled pawns
+        score = 10 - (doubled * 2)
+        
+        return max(0, score)
     
     def _is_in_opening(self, board):
         """Check if we're still in the opening phase (roughly first 10 moves)."""
@@ -1126,93 +1236,47 @@ class ChessDoctor:
         else:
             return from_rank - to_rank
     
-    def _move_attacks_piece(self, board, move, opponent_color):
-        """Check if a move directly attacks an opponent's piece."""
-        if not move:
-            return False
-            
-        # Create a board after the move
-        board_after = board.copy()
-        board_after.push(move)
-        
-        # Check if the move's destination square attacks any opponent pieces
-        for square in range(64):
-            piece = board_after.piece_at(square)
-            if piece and piece.color == opponent_color:
-                if board_after.is_attacked_by(not opponent_color, square):
-                    return True
-        
-        return False
+    def _move_attacks_piece(self, board_after, opponent_color, attacked=None):
+        """Check if the position after a move has any opponent piece under attack."""
+        if attacked is None:
+            attacked = self._attacked_mask(board_after, not opponent_color)
+        return bool(attacked & board_after.occupied_co[opponent_color])
     
-    def _move_defends_piece(self, board, move, color):
-        """Check if a move defends a piece under attack."""
-        if not move:
-            return False
-            
-        # Look for pieces under attack
-        threatened_pieces = []
-        for square in range(64):
-            piece = board.piece_at(square)
-            if piece and piece.color == color:
-                if board.is_attacked_by(not color, square):
-                    threatened_pieces.append(square)
-        
-        if not threatened_pieces:
-            return False
-            
-        # Check if the move defends any of those pieces
-        board_after = board.copy()
-        board_after.push(move)
-        
-        for square in threatened_pieces:
-            # Check if the piece is still on the board (wasn't captured)
-            piece = board_after.piece_at(square)
-            if piece and piece.color == color:
-                # Check if it's now defended
-                if board_after.is_attacked_by(color, square):
-                    return True
-        
-        return False
+    def _threatened_mask(self, board, color):
+        """Bitboard of the given color's pieces that are under attack."""
+        return self._attacked_mask(board, not color) & board.occupied_co[color]
+    
+    def _move_defends_piece(self, board_after, threatened, color, attacked=None):
+        """Check if a move defends one of the pieces that were under attack before it."""
+        if attacked is None:
+            attacked = self._attacked_mask(board_after, color)
+        # Only pieces still on the board (not captured or moved away) count
+        return bool(threatened & board_after.occupied_co[color] & attacked)
     
-    def _check_file_control(self, board, move, color):
+    def _check_file_control(self, board_after, move, color):
         """Check if the move results in controlling an open or semi-open file."""
         if not move:
             return False
             
-        # Check if it's a piece that benefits from file/diagonal control
-        piece = board.piece_at(move.from_square)
+        # Check if it's a piece that benefits from file/diagonal control; the
+        # board is the position after the move, so the piece is on its target square
+        piece = board_after.piece_at(move.to_square)
         if not piece or piece.piece_type not in [chess.ROOK, chess.QUEEN, chess.BISHOP]:
             return False
             
         # For rooks and queens, check file control
         if piece.piece_type in [chess.ROOK, chess.QUEEN]:
-            file = chess.square_file(move.to_square)
-            
-            # Check if the file is open or semi-open
-            file_has_pawns = False
-            own_pawns_on_file = False
-            
-            for rank in range(8):
-                square = chess.square(file, rank)
-                p = board.piece_at(square)
-                if p and p.piece_type == chess.PAWN:
-                    file_has_pawns = True
-                    if p.color == color:
-                        own_pawns_on_file = True
+            pawns_on_file = board_after.pawns & chess.BB_FILES[chess.square_file(move.to_square)]
+            own_pawns_on_file = pawns_on_file & board_after.occupied_co[color]
             
             # Return true for open files or semi-open files
-            return not file_has_pawns or not own_pawns_on_file
+            return not pawns_on_file or not own_pawns_on_file
             
         # For bishops, check diagonal control
         elif piece.piece_type == chess.BISHOP:
             # Simplified check - see if the bishop attacks many squares post-move
-            board_after = board.copy()
-            attack_count = 0
+            attack_count = chess.popcount(board_after.attacks_mask(move.to_square))
             
-            for square in range(64):
-                if board_after.is_attacked_by(color, square) and board.piece_at(move.from_square) == piece:
-                    attack_count += 1
-                    
             return attack_count >= 7  # Bishop on a good diagonal attacks 7+ squares
             
         return False
@@ -1224,53 +1288,25 @@ class ChessDoctor:
     
     def _is_outpost(self, board, square, color):
         """Check if a square is a strong outpost for a knight."""
-        # An outpost is typically a square that can't be attacked by enemy pawns
-        # and is supported by friendly pawns
+        # An outpost is typically a square in enemy territory that can't be attacked
+        # by enemy pawns and is supported by a friendly piece
+        if color == chess.WHITE and chess.square_rank(square) < 4:
+            return False
+        if color == chess.BLACK and chess.square_rank(square) > 3:
+            return False
         
-        if color == chess.WHITE:
-            # For white, check if black pawns can attack the square
-            left_attack = chess.square(chess.square_file(square) - 1, chess.square_rank(square) - 1)
-            right_attack = chess.square(chess.square_file(square) + 1, chess.square_rank(square) - 1)
-            
-            # Check if the square is in enemy territory
-            if chess.square_rank(square) < 4:
-                return False
-                
-        else:  # BLACK
-            # For black, check if white pawns can attack the square
-            left_attack = chess.square(chess.square_file(square) - 1, chess.square_rank(square) + 1)
-            right_attack = chess.square(chess.square_file(square) + 1, chess.square_rank(square) + 1)
-            
-            # Check if the square is in enemy territory
-            if chess.square_rank(square) > 3:
-                return False
+        # A pawn of one color attacks a square from the squares a pawn of the other
+        # color on that square would attack
+        enemy_pawns = board.pawns & board.occupied_co[not color]
+        if chess.BB_PAWN_ATTACKS[color][square] & enemy_pawns:
+            return False
         
-        # Check if square can be attacked by enemy pawns
-        try:
-            left_piece = board.piece_at(left_attack)
-            if left_piece and left_piece.piece_type == chess.PAWN and left_piece.color != color:
-                return False
-        except ValueError:
-            pass  # Square is off the board
-            
-        try:
-            right_piece = board.piece_at(right_attack)
-            if right_piece and right_piece.piece_type == chess.PAWN and right_piece.color != color:
-                return False
-        except ValueError:
-            pass  # Square is off the board
-            
         # Check if square is defended by friendly pieces
         return board.is_attacked_by(color, square)
     
     def _keeps_bishop_pair(self, board, color):
         """Check if a position maintains the bishop pair."""
-        bishops = 0
-        for square in range(64):
-            piece = board.piece_at(square)
-            if piece and piece.piece_type == chess.BISHOP and piece.color == color:
-                bishops += 1
-        return bishops >= 2
+        return chess.popcount(board.bishops & board.occupied_co[color]) >= 2
     
     def _get_piece_name(self, board, square):
         """Get the name of the piece at a square."""
@@ -1289,59 +1325,104 @@ class ChessDoctor:
         
         return piece_names.get(piece.piece_type)
     
-    def _look_for_future_tactics(self, board, color):
-        """Look one move ahead for tactical opportunities."""
-        # Make a shallow search to see if there's something tactical coming up
+    def _look_for_future_tactics(self, board, color, existing_pv=None, existing_score=None):
+        """
+        Look one move ahead for tactical opportunities.
+        
+        Args:
+            board: The position to look at
+            color: The side looking for tactics
+            existing_pv: Line already searched from this position, if any
+            existing_score: Score of that line
+        """
         try:
-            result = self.engine.analyse(
-                board, 
-                chess.engine.Limit(depth=8, time=0.1),
-                multipv=1
-            )
-            
-            if result and len(result) > 0:
-                score = result[0]["score"].white()
-                # If score significantly changes, there might be tactics
-                if color == chess.WHITE and score.score() > 150:
-                    return "a tactical opportunity"
-                elif color == chess.BLACK and score.score() < -150:
-                    return "a tactical opportunity"
-                
-                # Check for specific PV patterns
-                if len(result[0]["pv"]) >= 2:
-                    first_move = result[0]["pv"][0]
-                    second_move = result[0]["pv"][1]
-                    
-                    # See if the second move is a capture
-                    if board.is_capture(second_move):
-                        return "a tactical sequence"
-                        
-                    # Check for discovered attacks
-                    board_after = board.copy()
-                    board_after.push(first_move)
-                    if self._is_discovered_attack(board, board_after, color):
-                        return "a discovered attack"
-                        
-        except Exception:
-            pass
-            
+            if existing_pv and len(existing_pv) >= 2 and existing_score is not None:
+                pv, pov_score = existing_pv, existing_score
+            else:
+                # Make a shallow search to see if there's something tactical coming up
+                result = self.engine.analyse(
+                    board, 
+                    chess.engine.Limit(depth=8, time=0.1),
+                    info=ANALYSIS_INFO,
+                    game=self._game
+                )
+                pv, pov_score = result.get("pv", []), result["score"]
+        except chess.engine.EngineError:
+            return None  # No hint if the engine can't search the position
+        
+        # Mate scores count as a large advantage
+        score = pov_score.white().score(mate_score=100000)
+        # If score significantly changes, there might be tactics
+        if color == chess.WHITE and score > 150:
+            return "a tactical opportunity"
+        elif color == chess.BLACK and score < -150:
+            return "a tactical opportunity"
+        
+        # Check for specific PV patterns
+        if len(pv) >= 2:
+            first_move = pv[0]
+            second_move = pv[1]
+            board_after = board.copy(stack=False)
+            board_after.push(first_move)
+            
+            # See if the second move is a capture
+            if board_after.is_capture(second_move):
+                return "a tactical sequence"
+            
+            # Check for discovered attacks
+            if self._is_discovered_attack(board, board_after, color):
+                return "a discovered attack"
+        
         return None
     
     def _is_discovered_attack(self, board_before, board_after, color):
         """Check if a move creates a discovered attack."""
-        for square in range(64):
-            piece = board_after.piece_at(square)
-            if not piece or piece.color != (not color):
-                continue
-                
-            # Check if the piece is now under attack but wasn't before
-            if board_after.is_attacked_by(color, square) and not board_before.is_attacked_by(color, square):
-                return True
-                
-        return False
+        # Opponent pieces that are now under attack but weren't before
+        newly_attacked = self._attacked_mask(board_after, color) & ~self._attacked_mask(board_before, color)
+        return bool(newly_attacked & board_after.occupied_co[not color])
 
-    def analyze_game(self, pgn_file_path):
-        """Analyze a game from a PGN file and return the analysis as JSON data."""
+    def analyze_game(self, pgn_file_path, pool=None):
+        """
+        Analyze a game from a PGN file and return the analysis as JSON data.
+        
+        Args:
+            pgn_file_path: Path to the PGN file
+            pool: Optional ChessDoctorPool used to evaluate all positions of the
+                game in parallel before the move-by-move analysis
+        """
+        try:
+            with open(pgn_file_path) as pgn_file:
+                game = chess.pgn.read_game(pgn_file)
+        except FileNotFoundError:
+            error_msg = f"Error: PGN file '{pgn_file_path}' not found"
+            print(error_msg)
+            return {"game_info": {}, "moves": [], "errors": [error_msg]}
+        except Exception as e:
+            error_msg = f"Error analyzing game: {str(e)}"
+            print(error_msg)
+            return {"game_info": {}, "moves": [], "errors": [error_msg]}
+        
+        return self._analyze_parsed_game(game, pool)
+    
+    def analyze_game_from_string(self, pgn_str, pool=None):
+        """
+        Analyze a game from PGN text and return the analysis as JSON data.
+        
+        Args:
+            pgn_str: The game in PGN notation
+            pool: Optional ChessDoctorPool, as for analyze_game
+        """
+        try:
+            game = chess.pgn.read_game(io.StringIO(pgn_str))
+        except Exception as e:
+            error_msg = f"Error analyzing game: {str(e)}"
+            print(error_msg)
+            return {"game_info": {}, "moves": [], "errors": [error_msg]}
+        
+        return self._analyze_parsed_game(game, pool)
+    
+    def _analyze_parsed_game(self, game, pool=None):
+        """Analyze the main line of a parsed game."""
         analysis_data = {
             "game_info": {},
             "moves": [],
@@ -1349,14 +1430,15 @@ class ChessDoctor:
         }
         
         try:
-            with open(pgn_file_path) as pgn_file:
-                game = chess.pgn.read_game(pgn_file)
-                
             if not game:
                 error_msg = "Error: Could not read game from PGN file"
                 print(error_msg)
                 analysis_data["errors"].append(error_msg)
                 return analysis_data
+            
+            # Passing a new game to the engine sends "ucinewgame", which clears its
+            # hash table without restarting the process
+            self._game = game
                 
             # Game headers
             analysis_data["game_info"] = {
@@ -1375,9 +1457,23 @@ class ChessDoctor:
             board = game.board()
             node = game
             
+            # With a pool, every position is evaluated up front in parallel and the
+            # loop below finds them all in the evaluation cache
+            if pool is not None:
+                self._prefetch_evaluations(game, pool)
+            
             # Store the previous position's evaluation
             prev_score = self._get_position_evaluation(board)
             
+            # SAN for the whole main line in one pass, without the move numbers. A line
+            # with a move variation_san refuses (a null move "--") gets SAN move by move
+            try:
+                mainline_sans = [token.split(".")[-1]
+                                 for token in board.variation_san(list(game.mainline_moves())).split()
+                                 if not token.endswith(".")]
+            except chess.IllegalMoveError:
+                mainline_sans = []
+            
             # Track move numbers
             ply = 0
             
@@ -1388,12 +1484,26 @@ class ChessDoctor:
                     node = node.variations[0]  # Follow main line
                     move = node.move
                     
+                    # Store the board position before the move
+                    board_before_move = board.copy()
+                    
+                    # Apply the move to our board
+                    board.push(move)
+                    ply += 1
+                    
+                    # Let the engine evaluate the new position while we do the
+                    # bookkeeping for this move
+                    pending_evaluation = self._start_position_evaluation(board)
+                    
                     # Get move in algebraic notation
-                    san_move = board.san(move)
+                    if ply <= len(mainline_sans):
+                        san_move = mainline_sans[ply - 1]
+                    else:
+                        san_move = board_before_move.san(move)
                     
                     # Whose move it is (True for White, False for Black)
-                    is_white_move = (ply % 2 == 0)
-                    move_number = ply // 2 + 1  # Chess move numbering (1. e4 e5, 2. Nf3 ...)
+                    is_white_move = ((ply - 1) % 2 == 0)
+                    move_number = (ply - 1) // 2 + 1  # Chess move numbering (1. e4 e5, 2. Nf3 ...)
                     
                     # Start a new line for each full move
                     if is_white_move:
@@ -1406,15 +1516,8 @@ class ChessDoctor:
                     best_move = None
                     explanation = None
                     
-                    # Store the board position before the move
-                    board_before_move = board.copy()
-                    
-                    # Apply the move to our board
-                    board.push(move)
-                    ply += 1
-                    
                     # Get evaluation after the move
-                    curr_score = self._get_position_evaluation(board)
+                    curr_score = self._finish_position_evaluation(pending_evaluation)
                     
                     # Calculate score difference from the player's perspective
                     if is_white_move:
@@ -1507,35 +1610,214 @@ class ChessDoctor:
             
             print("\nAnalysis complete!")
             
-        except FileNotFoundError:
-            error_msg = f"Error: PGN file '{pgn_file_path}' not found"
-            print(error_msg)
-            analysis_data["errors"].append(error_msg)
         except Exception as e:
             error_msg = f"Error analyzing game: {str(e)}"
             print(error_msg)
             analysis_data["errors"].append(error_msg)
-        finally:
-            # Make sure to quit the engine
-            if hasattr(self, 'engine'):
-                self.engine.quit()
         
         return analysis_data
     
+    def _prefetch_evaluations(self, game, pool):
+        """Evaluate the main line's positions across an engine pool and cache the results."""
+        boards = []
+        keys = []
+        seen = set()
+        board = game.board()
+        for move in itertools.chain([None], game.mainline_moves()):
+            if move is not None:
+                board.push(move)
+            key = self._evaluation_key(board)
+            if key not in self._tt and key not in seen:
+                boards.append(board.copy())
+                keys.append(key)
+                seen.add(key)
+        
+        limit = chess.engine.Limit(depth=self.depth, time=self.time_limit)
+        for key, info in zip(keys, pool.analyse_boards(boards, limit)):
+            self._cache_store(key, info)
+    
     def _get_position_evaluation(self, board):
         """Get the evaluation of the current position."""
-        result = self.engine.analyse(
-            board, 
-            chess.engine.Limit(depth=self.depth, time=self.time_limit)
+        return self._analyse_full(board)["score"]
+    
+    def _analyse_full(self, board):
+        """Get the score and principal variation of a position, searching it only once."""
+        return self._analyse_cached(board, chess.engine.Limit(depth=self.depth, time=self.time_limit))
+    
+    def _start_position_evaluation(self, board):
+        """Start evaluating a position in the background unless it was already evaluated."""
+        key = self._evaluation_key(board)
+        info = self._tt.get(key)
+        if info is not None:
+            return key, info
+        return key, self.engine.analysis(
+            board,
+            chess.engine.Limit(depth=self.depth, time=self.time_limit),
+            info=ANALYSIS_INFO,
+            game=self._game
         )
-        return result["score"]
+    
+    def _finish_position_evaluation(self, pending):
+        """Wait for a background evaluation to finish and return its score."""
+        key, analysis = pending
+        if isinstance(analysis, dict):
+            return analysis["score"]
+        with analysis:
+            analysis.wait()
+            info = self._cache_store(key, analysis.info)
+        return info["score"]
+    
+    def _evaluation_key(self, board):
+        """Transposition table key of a position evaluated with the game analysis search limit."""
+        return self._cache_key(board, chess.engine.Limit(depth=self.depth, time=self.time_limit))
     
     def _classify_move(self, score_diff):
         """Classify a move based on the score difference."""
-        if score_diff <= self.blunder_threshold:
-            return "blunder"
-        elif score_diff <= self.mistake_threshold:
-            return "mistake"
-        elif score_diff <= self.inaccuracy_threshold:
-            return "inaccuracy"
-        return "good move"
\ No newline at end of file
+        # Read the thresholds on every call, so changes to them take effect
+        thresholds = (self.blunder_threshold, self.mistake_threshold, self.inaccuracy_threshold)
+        return self._labels[bisect.bisect_left(thresholds, score_diff)]
+
+
+class ChessDoctorPool:
+    """Pool of Stockfish processes for evaluating many independent positions in parallel."""
+    
+    def __init__(self, stockfish_path=None, num_workers=None, hash_mb=64):
+        """
+        Start the engine processes for the pool.
+        
+        Args:
+            stockfish_path: Path to the Stockfish executable (auto-detected if not provided)
+            num_workers: Number of engine processes (defaults to half the CPU count)
+            hash_mb: Hash table size for each engine process
+        """
+        if not stockfish_path:
+            stockfish_path = ChessDoctor._find_stockfish()
+        
+        if not stockfish_path or not os.path.exists(stockfish_path):
+            print(f"Error: Stockfish engine not found at {stockfish_path}")
+            print("Please install Stockfish and provide the path using --engine option")
+            sys.exit(1)
+        
+        if not num_workers:
+            num_workers = max(1, (os.cpu_count() or 1) // 2)
+        
+        # One search thread and a private hash per process, so workers don't contend
+        self.engines = []
+        for _ in range(num_workers):
+            engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
+            engine.configure({"Threads": 1, "Hash": hash_mb})
+            self.engines.append(engine)
+        
+        # Engines that are not currently running a search
+        self._idle = queue.Queue()
+        for engine in self.engines:
+            self._idle.put(engine)
+        
+        # In case the caller never closes the pool
+        close_at_exit(self)
+        
+        self.depth = 22
+        self.time_limit = 0.5  # seconds per position
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def analyze_positions(self, fens):
+        """
+        Evaluate a list of positions across the engine pool.
+        
+        Args:
+            fens: List of FEN strings
+            
+        Returns:
+            A list of PovScore evaluations in the same order as the input
+        """
+        return [info["score"] for info in self.analyse_boards([chess.Board(fen) for fen in fens])]
+    
+    def analyse_boards(self, boards, limit=None):
+        """
+        Analyse a list of boards across the engine pool.
+        
+        Args:
+            boards: List of chess.Board positions; their move stacks are sent to the engine
+            limit: Search limit (defaults to the pool's depth and time limit)
+            
+        Returns:
+            A list of analysis info dicts (score and PV) in the same order as the input
+        """
+        if limit is None:
+            limit = chess.engine.Limit(depth=self.depth, time=self.time_limit)
+        
+        def analyse(board):
+            engine = self._idle.get()
+            try:
+                return engine.analyse(board, limit, info=ANALYSIS_INFO)
+            finally:
+                self._idle.put(engine)
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.engines)) as executor:
+            return list(executor.map(analyse, boards))
+    
+    def close(self):
+        """Shut down all engine processes."""
+        for engine in self.engines:
+            engine.quit()
+        self.engines = []
+
+
+def split_pgn_games(pgn_str):
+    """Split PGN text holding several games into one PGN string per game."""
+    pgn = io.StringIO(pgn_str)
+    offsets = []
+    while True:
+        offset = pgn.tell()
+        # Reads a game's headers and skips past its moves
+        if chess.pgn.read_headers(pgn) is None:
+            break
+        offsets.append(offset)
+    
+    return [pgn_str[start:end] for start, end in zip(offsets, offsets[1:] + [len(pgn_str)])]
+
+
+def _start_game_worker(stockfish_path):
+    """Start the analyzer of a worker process once, before it takes any games."""
+    # One search thread and a small hash per engine, since every worker runs its own
+    # (as in ChessDoctorPool)
+    ChessDoctor.shared(stockfish_path, threads=1, hash_mb=64)
+
+
+def _analyze_game_in_worker(pgn_str):
+    """Analyze one game with the worker process's analyzer."""
+    return ChessDoctor.shared().analyze_game_from_string(pgn_str)
+
+
+def analyze_games_parallel(pgn_games, stockfish_path=None, workers=None):
+    """
+    Analyze independent games in parallel, one Stockfish process per worker.
+    
+    Args:
+        pgn_games: List of PGN strings, one game each (see split_pgn_games)
+        stockfish_path: Path to the Stockfish executable (auto-detected if not provided)
+        workers: Number of worker processes (defaults to the CPU count)
+        
+    Returns:
+        A list of analyses in the same order as the input
+    """
+    if not pgn_games:
+        return []
+    
+    if not workers:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(pgn_games))
+    
+    # Spawned rather than forked workers, so none inherits a running engine from this process
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_start_game_worker,
+        initargs=(stockfish_path,)
+    ) as executor:
+        return list(executor.map(_analyze_game_in_worker, pgn_games))
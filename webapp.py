@@ -0,0 +1,244 @@
+import contextlib
+import hashlib
+import io
+import os
+import queue
+import re
+import threading
+from collections import OrderedDict
+import chess.engine
+import chess.pgn
+import orjson
+from flask import Blueprint, Flask, current_app, request, jsonify, render_template
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
+from werkzeug.exceptions import RequestEntityTooLarge
+from whitenoise import WhiteNoise
+from engine import ChessDoctor, close_at_exit
+
+# Seconds browsers may cache the web UI's static files
+STATIC_MAX_AGE = 86400
+
+# Largest request body accepted (a PGN of a long game is a few KB), and longest game analyzed
+MAX_UPLOAD_BYTES = 2 * 1024 * 1024
+MAX_PLIES = 600
+
+# Most analyzers (Stockfish processes) one process runs at once
+MAX_ENGINES = 4
+
+# Every SAN move names a destination square or castles; PGN text without either has no moves
+_MOVE_TOKEN_RE = re.compile(r'[a-h][1-8]|O-O')
+
+# Routes of the web app; create_app() builds an app around them
+bp = Blueprint('chessdoctor', __name__)
+
+# Compresses responses (an analysis is JSON of tens of KB, which shrinks several times over)
+compress = Compress()
+
+# Analyses of recently submitted games, keyed by a hash of the PGN text (least recently used first)
+_ANALYSIS_CACHE = OrderedDict()
+_CACHE_MAX = 512
+_cache_lock = threading.Lock()
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON handling (request.get_json, jsonify) done by orjson, so large PGN uploads parse quickly"""
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SORT_KEYS if kwargs.get("sort_keys", self.sort_keys) else 0
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+class _PlyCounter(chess.pgn.BaseVisitor):
+    """Count the main line moves of a game without building its move tree"""
+    
+    def begin_game(self):
+        self.plies = 0
+    
+    def begin_variation(self):
+        return chess.pgn.SKIP
+    
+    def visit_move(self, board, move):
+        self.plies += 1
+    
+    def handle_error(self, error):
+        # Like the analyzer's parser, count up to an illegal move instead of failing
+        pass
+    
+    def result(self):
+        return self.plies
+
+class DoctorPool:
+    """
+    A bounded set of analyzers shared by a process's requests.
+    
+    The pool has a fixed number of slots. A request takes an idle analyzer, or starts one
+    in an empty slot; when neither is left it waits instead of starting more Stockfish
+    processes. Starting on demand also keeps engines out of a process that forks later.
+    """
+    
+    def __init__(self, stockfish_path=None, size=1, threads=1, hash_mb=64):
+        self.stockfish_path = stockfish_path
+        self.threads = threads
+        self.hash_mb = hash_mb
+        # Idle analyzers, and None for each slot without one. Last in, first out, so an
+        # idle analyzer is reused before another engine is started
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)
+        self._doctors = set()
+        close_at_exit(self)
+    
+    @contextlib.contextmanager
+    def borrow(self):
+        """Lend an analyzer for one game, waiting if all of them are busy"""
+        doctor = self._idle.get()
+        if doctor is None:
+            try:
+                doctor = ChessDoctor(self.stockfish_path, threads=self.threads, hash_mb=self.hash_mb)
+            except BaseException:
+                self._idle.put(None)
+                raise
+            self._doctors.add(doctor)
+        
+        try:
+            yield doctor
+        except BaseException:
+            self._discard(doctor)
+            raise
+        # The analyzer reports a crashed engine as an analysis error rather than raising
+        if not doctor.is_running():
+            self._discard(doctor)
+        else:
+            self._idle.put(doctor)
+    
+    def _discard(self, doctor):
+        """Shut down a failed analyzer and free its slot for a new one"""
+        self._doctors.discard(doctor)
+        try:
+            doctor.close()
+        except chess.engine.EngineError:
+            pass
+        self._idle.put(None)
+    
+    def close(self):
+        """Shut down every analyzer the pool started"""
+        for doctor in list(self._doctors):
+            try:
+                doctor.close()
+            except chess.engine.EngineError:
+                pass
+        self._doctors.clear()
+
+def borrow_doctor():
+    """Lend one of this process's analyzers for one game"""
+    return current_app.extensions["chessdoctor"].borrow()
+
+def json_response(data):
+    """Serialize a (large) analysis result with orjson, which is much faster than jsonify"""
+    return current_app.response_class(orjson.dumps(data), mimetype='application/json')
+
+@bp.route('/')
+def index():
+    """Serve the index.html page at the root URL"""
+    return current_app.config["INDEX_HTML"]
+
+@bp.route('/api/analyze', methods=['POST'])
+def analyze():
+    """Analyze a chess game from PGN data"""
+    # Check if PGN data is provided
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    if 'pgn' not in data:
+        return jsonify({"error": "Missing 'pgn' field in request"}), 400
+    
+    pgn_data = data['pgn']
+    if not isinstance(pgn_data, str):
+        return jsonify({"error": "'pgn' must be a string"}), 400
+    
+    # Turn away input with no moves, and overly long games (every move costs an engine
+    # search), before taking the engine; the regex spares parsing obvious junk
+    plies = 0
+    if _MOVE_TOKEN_RE.search(pgn_data):
+        plies = chess.pgn.read_game(io.StringIO(pgn_data), Visitor=_PlyCounter) or 0
+    if not plies:
+        return jsonify({"error": "No moves found"}), 400
+    if plies > MAX_PLIES:
+        return jsonify({"error": f"Game too long (more than {MAX_PLIES} plies)"}), 422
+    
+    # The same game always gets the same analysis, so repeated requests are answered from memory
+    cache_key = hashlib.blake2b(pgn_data.encode(), digest_size=16).digest()
+    with _cache_lock:
+        cached = _ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            _ANALYSIS_CACHE.move_to_end(cache_key)
+    if cached is not None:
+        return json_response(cached)
+    
+    # Analyze the game
+    try:
+        # An analyzer works through one game at a time
+        with borrow_doctor() as doctor:
+            analysis_data = doctor.analyze_game_from_string(pgn_data)
+    except Exception as e:
+        return jsonify({"error": f"Analysis failed: {str(e)}"}), 500
+    
+    # Only complete analyses are worth repeating
+    if not analysis_data["errors"]:
+        with _cache_lock:
+            _ANALYSIS_CACHE[cache_key] = analysis_data
+            if len(_ANALYSIS_CACHE) > _CACHE_MAX:
+                _ANALYSIS_CACHE.popitem(last=False)
+    
+    return json_response(analysis_data)
+
+@bp.app_errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({"error": "PGN too large"}), 413
+
+@bp.route('/health', methods=['GET'])
+def health():
+    return jsonify({"status": "ok"})
+
+def create_app(engine_path=None, engines=1, threads=1, hash_mb=64):
+    """
+    Create the Chess Doctor web app.
+    
+    Args:
+        engine_path: Path to the Stockfish executable (auto-detected if not provided)
+        engines: Most games this process analyzes at once, each with its own Stockfish
+        threads: Search threads per engine; all engines on the host should share its CPUs
+        hash_mb: Hash table size per engine in MB
+    """
+    # No Flask static route: WhiteNoise serves the page's files from templates/ (see below)
+    app = Flask(__name__,
+               static_folder=None,
+               template_folder='templates')
+    app.extensions["chessdoctor"] = DoctorPool(engine_path, min(engines, MAX_ENGINES), threads, hash_mb)
+    # Werkzeug refuses larger uploads before they are read and parsed
+    app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+    app.json = OrjsonProvider(app)
+    app.register_blueprint(bp)
+    
+    # Prefer Brotli, falling back to gzip; small responses aren't worth compressing
+    app.config["COMPRESS_ALGORITHM"] = ['br', 'gzip']
+    app.config["COMPRESS_MIN_SIZE"] = 1024
+    compress.init_app(app)
+    
+    # The landing page has no per-request content, so render it once
+    app.config["TEMPLATES_AUTO_RELOAD"] = False
+    with app.app_context():
+        app.config["INDEX_HTML"] = render_template('index.html')
+    
+    # The page's CSS, JS and images are plain files; WhiteNoise serves them before
+    # a request reaches Flask, leaving the workers free for analyses. They only change
+    # with a new chessboard.js version, so browsers may keep them for a day and then
+    # revalidate (WhiteNoise answers If-Modified-Since / If-None-Match with a 304)
+    app.wsgi_app = WhiteNoise(app.wsgi_app, root=os.path.join(app.root_path, 'templates'), prefix='/',
+                              max_age=STATIC_MAX_AGE)
+    return app
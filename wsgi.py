@@ -0,0 +1,6 @@
+import os
+from webapp import create_app
+
+# The app a WSGI server imports (gunicorn wsgi:app), configured from the environment.
+# gunicorn runs a worker process per CPU, so each one gets a single one-thread analyzer
+app = create_app(os.environ.get("STOCKFISH_PATH"))